@@ -3,7 +3,6 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
 import sys
 from pathlib import Path
@@ -11,10 +10,10 @@ from typing import Dict
 
 from flask import Flask
 
-from .camera import build_cams, detect_devices
+from .camera import build_cams, detect_devices, fetch_controls_many
 from .routes import register_routes
 from .state import restore_state
-from .utils import log, parse_stream_prefixes
+from .utils import json_dumps_bytes, json_loads, log, parse_stream_prefixes
 
 
 def create_app(config: Dict | None = None) -> Flask:
@@ -28,8 +27,47 @@ def create_app(config: Dict | None = None) -> Flask:
     return app
 
 
+def dispatch_socket_request(app: Flask, req: Dict) -> bytes:
+    """Dispatch a socket request straight through Flask's routing.
+
+    Pushes a request context and calls full_dispatch_request directly,
+    skipping the per-request environ copying and cookie machinery of the
+    werkzeug test client. Returns the serialized response envelope
+    (without the newline terminator).
+    """
+    method = req.get("method", "GET").upper()
+    path = req.get("path", "/")
+    query = req.get("query", {})
+    body = req.get("body", {})
+
+    kwargs: Dict = {"method": method, "query_string": query}
+    if method == "POST":
+        kwargs["json"] = body
+    with app.test_request_context(path, **kwargs):
+        response = app.full_dispatch_request()
+
+    raw = response.get_data()
+    if response.content_type and "application/json" in response.content_type:
+        # The view's body is already encoded JSON; splice it into the
+        # envelope as-is instead of parsing and re-serializing it.
+        body_bytes = raw.strip() or b'""'
+    else:
+        body_bytes = json_dumps_bytes(raw.decode(errors="replace"))
+    return b'{"status": %d, "headers": %s, "body": %s}' % (
+        response.status_code,
+        json_dumps_bytes(dict(response.headers)),
+        body_bytes,
+    )
+
+
 def run_socket_server(app: Flask, sock_path: str) -> None:
-    """Run Unix socket server that proxies API requests."""
+    """Run Unix socket server that proxies API requests.
+
+    A selector-driven loop accepts and reads many connections concurrently,
+    so one slow client cannot stall the whole socket API while it trickles
+    its request in.
+    """
+    import selectors
     import socket
 
     if os.path.exists(sock_path):
@@ -37,77 +75,140 @@ def run_socket_server(app: Flask, sock_path: str) -> None:
 
     sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     sock.bind(sock_path)
-    sock.listen(5)
+    sock.listen(128)
+    sock.setblocking(False)
     os.chmod(sock_path, 0o666)
 
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ, None)
+
     log(f"Socket server listening on {sock_path}")
 
+    def close_conn(conn) -> None:
+        try:
+            sel.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+
+    def send_payload(conn, payload: bytes) -> None:
+        # Scatter-gather write: the payload and its newline terminator go
+        # out in one syscall without concatenating a new buffer. Replies
+        # are small; block with a cap so a dead peer cannot wedge the loop.
+        conn.settimeout(5.0)
+        sent = conn.sendmsg([payload, b"\n"])
+        if sent < len(payload) + 1:
+            conn.sendall((payload + b"\n")[sent:])
+
+    def handle_request(conn, data: bytes) -> None:
+        try:
+            # Both codecs take bytes and tolerate surrounding whitespace,
+            # so no decode/strip copy of the request is needed.
+            req = json_loads(data)
+            payload = dispatch_socket_request(app, req)
+        except Exception as exc:
+            log(f"Socket request error: {exc}")
+            # Splice the escaped message into a fixed envelope instead of
+            # serializing a fresh dict.
+            payload = (
+                b'{"status": 500, "body": {"error": '
+                + json_dumps_bytes(str(exc))
+                + b"}}"
+            )
+        try:
+            send_payload(conn, payload)
+        except OSError:
+            pass
+
     try:
         while True:
-            conn, _ = sock.accept()
-            try:
-                data = b""
-                while True:
-                    chunk = conn.recv(4096)
-                    if not chunk:
-                        break
-                    data += chunk
-                    if b"\n" in data:
-                        break
-
-                if data:
-                    req = json.loads(data.decode().strip())
-
-                    with app.test_client() as client:
-                        method = req.get("method", "GET").upper()
-                        path = req.get("path", "/")
-                        query = req.get("query", {})
-                        body = req.get("body", {})
-
-                        if query:
-                            from urllib.parse import urlencode
-
-                            path = f"{path}?{urlencode(query)}"
-
-                        if method == "POST":
-                            response = client.post(path, json=body)
-                        else:
-                            response = client.get(path)
-
-                        result = {
-                            "status": response.status_code,
-                            "headers": dict(response.headers),
-                            "body": response.get_data(as_text=True),
-                        }
-
-                        if response.content_type and "application/json" in response.content_type:
-                            try:
-                                result["body"] = json.loads(result["body"])
-                            except json.JSONDecodeError:
-                                pass
-
-                        conn.sendall((json.dumps(result) + "\n").encode())
-            except Exception as exc:
-                log(f"Socket request error: {exc}")
-                error_response = {"status": 500, "body": {"error": str(exc)}}
+            for key, _events in sel.select():
+                if key.data is None:
+                    try:
+                        conn, _ = sock.accept()
+                    except OSError:
+                        continue
+                    conn.setblocking(False)
+                    sel.register(conn, selectors.EVENT_READ, bytearray())
+                    continue
+                conn = key.fileobj
+                buf = key.data
                 try:
-                    conn.sendall((json.dumps(error_response) + "\n").encode())
-                except Exception:
-                    pass
-            finally:
-                conn.close()
+                    chunk = conn.recv(65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    close_conn(conn)
+                    continue
+                if not chunk:
+                    if buf:
+                        handle_request(conn, bytes(buf))
+                    close_conn(conn)
+                    continue
+                buf += chunk
+                if b"\n" in chunk:
+                    handle_request(conn, bytes(buf))
+                    close_conn(conn)
     finally:
+        sel.close()
         sock.close()
         if os.path.exists(sock_path):
             os.unlink(sock_path)
 
 
+def serve_http(app: Flask, host: str, port: int, server: str, cam_count: int) -> None:
+    """Serve the app over TCP with the requested (or best available) backend.
+
+    The Werkzeug development server is single-process; gunicorn (prefork,
+    threaded workers) or waitress give real concurrency for ioctl and
+    subprocess waits. "auto" picks the best backend that is installed.
+    """
+    if server in ("auto", "gunicorn"):
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            if server == "gunicorn":
+                raise SystemExit("gunicorn is not installed")
+        else:
+            class _GunicornApp(BaseApplication):
+                def load_config(self):
+                    self.cfg.set("bind", f"{host}:{port}")
+                    self.cfg.set("workers", min(4, cam_count + 1))
+                    self.cfg.set("worker_class", "gthread")
+                    self.cfg.set("threads", 4)
+
+                def load(self):
+                    return app
+
+            _GunicornApp().run()
+            return
+    if server in ("auto", "waitress"):
+        try:
+            from waitress import serve
+        except ImportError:
+            if server == "waitress":
+                raise SystemExit("waitress is not installed")
+        else:
+            serve(app, host=host, port=port)
+            return
+    app.run(host=host, port=port, threaded=True)
+
+
 def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="V4L2 control UI")
     parser.add_argument("--device", action="append", default=[], help="V4L2 device path")
     parser.add_argument("--host", help="Host to bind (default: 0.0.0.0)")
     parser.add_argument("--port", type=int, help="Port to bind (default: 5000)")
     parser.add_argument("--socket", help="Unix socket path (if set, runs socket server)")
+    parser.add_argument(
+        "--server",
+        choices=["auto", "flask", "waitress", "gunicorn"],
+        default="auto",
+        help=(
+            "HTTP server backend (default: auto — gunicorn or waitress if installed, "
+            "else the Flask development server)"
+        ),
+    )
     parser.add_argument(
         "--camera-url", default="http://127.0.0.1/", help="Camera stream base URL"
     )
@@ -187,6 +288,10 @@ def main(argv: list[str] | None = None) -> None:
         "socket_mode": start_socket and not start_tcp,
     }
 
+    # Warm the per-device control cache in parallel so neither the state
+    # restore below nor the first UI load pays a serial per-device query.
+    fetch_controls_many([cam.device for cam in cams])
+
     state_dir = None
     if args.state_dir:
         state_dir = Path(args.state_dir).expanduser()
@@ -211,13 +316,13 @@ def main(argv: list[str] | None = None) -> None:
         socket_thread.start()
         log(f"Starting v4l2-ctrls socket server at {args.socket} for {len(cams)} camera(s)")
         log(f"Starting v4l2-ctrls HTTP server on {host}:{port} for {len(cams)} camera(s)")
-        app.run(host=host, port=port, threaded=True)
+        serve_http(app, host, port, args.server, len(cams))
     elif start_socket:
         log(f"Starting v4l2-ctrls socket server at {args.socket} for {len(cams)} camera(s)")
         run_socket_server(app, args.socket)
     else:
         log(f"Starting v4l2-ctrls HTTP server on {host}:{port} for {len(cams)} camera(s)")
-        app.run(host=host, port=port, threaded=True)
+        serve_http(app, host, port, args.server, len(cams))
 
 
 if __name__ == "__main__":
@@ -2,14 +2,21 @@
 
 from __future__ import annotations
 
-import glob
 import os
 import re
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 
-from .utils import format_stream_path, log, normalize_prefix
+from . import v4l2ioctl
+from .utils import compile_stream_template, json_dumps_bytes, log, normalize_prefix
+
+# Controls are queried and set via direct VIDIOC ioctls by default; set
+# V4L2_CTRLS_BACKEND=v4l2-ctl to force the subprocess/text-parsing path.
+V4L2_BACKEND = os.environ.get("V4L2_CTRLS_BACKEND", "ioctl")
 
 CONTROL_ORDER = [
     "focus_auto",
@@ -34,54 +41,125 @@ AUTO_FIRST_CONTROLS = {
     "focus_automatic_continuous",
 }
 
+# The control set of a device is effectively static between writes, so
+# query results are cached briefly: long enough that the UI's usual GET
+# ctrls / POST set pair hits the cache, short enough that out-of-band
+# changes (another process poking the device) surface quickly. Writers
+# invalidate explicitly.
+CTRL_CACHE_TTL = 2.0
+
+_ctrl_cache_lock = threading.Lock()
+# key -> (timestamp, sorted controls, serialized payload bytes or None).
+# The payload slot is filled lazily by fetch_controls_payload.
+_CTRL_CACHE: Dict[Tuple[str, bool], Tuple[float, List[Dict], Optional[bytes]]] = {}
+
+
+def invalidate_controls(device: str) -> None:
+    """Drop cached control queries for device."""
+    with _ctrl_cache_lock:
+        for key in [key for key in _CTRL_CACHE if key[0] == device]:
+            del _CTRL_CACHE[key]
+
 
 @dataclass(frozen=True)
 class Camera:
     cam: str
     device: str
     prefix: str
-    streams: Dict[str, str]
+    stream_webrtc: str
+    stream_mjpg: str
+    stream_snapshot: str
     index: int
     basename: str
 
+    @property
+    def streams(self) -> Dict[str, str]:
+        return {
+            "webrtc": self.stream_webrtc,
+            "mjpg": self.stream_mjpg,
+            "snapshot": self.stream_snapshot,
+        }
+
 
-def parse_listed_devices(output: str) -> List[str]:
+def parse_listed_devices(output: bytes) -> List[str]:
     devices = []
     for line in output.splitlines():
         line = line.strip()
-        if not line.startswith("/dev/"):
+        if not line.startswith(b"/dev/"):
             continue
-        devices.append(line.split()[0])
+        devices.append(line.split()[0].decode())
     return devices
 
 
-def run_v4l2(args: List[str], timeout: float = 3.0) -> Tuple[int, str, str]:
+def run_v4l2(args: List[str], timeout: float = 3.0) -> Tuple[int, bytes, bytes]:
+    # Output stays as bytes: v4l2-ctl emits pure ASCII and the parsers use
+    # bytes patterns, so decoding the full buffer up front is wasted work.
+    # close_fds=False skips the fd-table walk at spawn; v4l2-ctl opens its
+    # own device node and inherits nothing it could misuse.
     try:
         result = subprocess.run(
             args,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
             check=False,
+            close_fds=False,
             timeout=timeout,
         )
         return result.returncode, result.stdout, result.stderr
     except subprocess.TimeoutExpired as exc:
-        return 124, "", f"Timeout running {' '.join(args)}: {exc}"
+        return 124, b"", f"Timeout running {' '.join(args)}: {exc}".encode()
+
+
+def decode_output(data: bytes) -> str:
+    """Decode v4l2-ctl output for endpoints and messages that need text."""
+    return data.decode(errors="replace")
+
+
+def scan_dev_nodes() -> Tuple[List[str], List[str]]:
+    """Classify /dev entries into V4L2 subdev and video nodes in one pass."""
+    subdevs: List[str] = []
+    videos: List[str] = []
+    try:
+        with os.scandir("/dev") as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith("v4l-subdev"):
+                    subdevs.append(f"/dev/{name}")
+                elif name.startswith("video") and name[5:].isdigit():
+                    videos.append(f"/dev/{name}")
+    except OSError:
+        pass
+    subdevs.sort()
+    videos.sort()
+    return subdevs, videos
 
 
 def detect_devices(limit: int = 8) -> List[str]:
-    devices: List[str] = []
-    code, out, _ = run_v4l2(["v4l2-ctl", "--list-devices"], timeout=2.0)
-    if code == 0:
-        devices = parse_listed_devices(out)
-    if not devices:
-        subdevs = sorted(glob.glob("/dev/v4l-subdev*"))
-        videos = sorted(glob.glob("/dev/video*"))
-        devices = subdevs + videos
-    subdevs = [device for device in devices if "/dev/v4l-subdev" in device]
-    others = [device for device in devices if device not in subdevs]
-    devices = subdevs + others
+    # Probe v4l2-ctl and scan /dev concurrently: the probe gives the richer
+    # driver-grouped listing when it answers in time, the scan is the
+    # fallback, and a hung or missing v4l2-ctl cannot stall startup.
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        probe = executor.submit(run_v4l2, ["v4l2-ctl", "--list-devices"], 2.0)
+        scan = executor.submit(scan_dev_nodes)
+        devices: List[str] = []
+        try:
+            code, out, _ = probe.result(timeout=2.5)
+            if code == 0:
+                devices = parse_listed_devices(out)
+        except Exception:
+            probe.cancel()
+        if devices:
+            listed_subdevs: List[str] = []
+            others: List[str] = []
+            for device in devices:
+                (listed_subdevs if "/dev/v4l-subdev" in device else others).append(device)
+            devices = listed_subdevs + others
+        else:
+            subdevs, videos = scan.result()
+            devices = subdevs + videos
+    finally:
+        executor.shutdown(wait=False)
     preferred = "/dev/v4l-subdev2"
     if preferred in devices:
         devices.remove(preferred)
@@ -101,51 +179,38 @@ def normalize_type(ctrl_type: Optional[str]) -> str:
     return ctrl_type
 
 
-def get_int_from_parts(parts: List[str], field: str) -> Optional[int]:
-    token = next((p for p in parts if p.startswith(f"{field}=")), None)
-    if not token:
-        return None
-    try:
-        return int(token.split("=", 1)[1])
-    except ValueError:
-        return None
+# One control per line: name, hex id, bracketed type, then key=value fields.
+_CTRL_LINE = re.compile(rb"^\s*(\S+)\s+0x[0-9a-fA-F]+\s+\(([^)]+)\)\s*:\s*(.*)$", re.MULTILINE)
+_CTRL_FIELD = re.compile(rb"\b(min|max|step|default|value)=(-?\d+)\b")
+# Menus output interleaves control lines with indented "index: label" items;
+# one multiline pattern matches either form so the buffer is scanned once.
+_MENU_LINE = re.compile(
+    rb"^[ \t]*(?:(\S+)[ \t]+0x[0-9a-fA-F]+[ \t]+\([^)]*\).*|(\d+):[ \t]*(.+?))[ \t]*$",
+    re.MULTILINE,
+)
 
 
-def parse_ctrls(output: str) -> List[Dict]:
+def parse_ctrls(output: bytes) -> List[Dict]:
     controls = []
-    for line in output.splitlines():
-        line = line.strip()
-        if not line or line.startswith("Error"):
-            continue
-
-        if "0x" not in line:
-            continue
-
-        parts = line.split()
-        if not parts:
-            continue
-        name = parts[0]
-        type_start = line.find("(")
-        type_end = line.find(")")
-        ctrl_type = None
-        if type_start != -1 and type_end != -1:
-            ctrl_type = line[type_start + 1 : type_end].strip()
-        flags_index = line.find("flags=")
+    for match in _CTRL_LINE.finditer(output):
+        name, ctrl_type, tail = match.groups()
+        fields = {m.group(1): int(m.group(2)) for m in _CTRL_FIELD.finditer(tail)}
+        flags_index = tail.find(b"flags=")
         read_only = False
         inactive = False
         if flags_index != -1:
-            flags_part = line[flags_index + 6 :]
-            read_only = "read-only" in flags_part
-            inactive = "inactive" in flags_part
+            flags_part = tail[flags_index + 6 :]
+            read_only = b"read-only" in flags_part
+            inactive = b"inactive" in flags_part
         controls.append(
             {
-                "name": name,
-                "type": normalize_type(ctrl_type),
-                "min": get_int_from_parts(parts, "min"),
-                "max": get_int_from_parts(parts, "max"),
-                "step": get_int_from_parts(parts, "step"),
-                "default": get_int_from_parts(parts, "default"),
-                "value": get_int_from_parts(parts, "value"),
+                "name": name.decode(),
+                "type": normalize_type(ctrl_type.strip().decode()),
+                "min": fields.get(b"min"),
+                "max": fields.get(b"max"),
+                "step": fields.get(b"step"),
+                "default": fields.get(b"default"),
+                "value": fields.get(b"value"),
                 "readonly": read_only,
                 "inactive": inactive,
                 "menu": [],
@@ -154,100 +219,170 @@ def parse_ctrls(output: str) -> List[Dict]:
     return controls
 
 
-def parse_ctrl_menus(output: str) -> Dict[str, List[Dict[str, str]]]:
+def parse_ctrl_menus(output: bytes) -> Dict[str, List[Dict[str, str]]]:
     """Parse v4l2-ctl --list-ctrls-menus output."""
     menus: Dict[str, List[Dict[str, str]]] = {}
     current = None
 
-    for line in output.splitlines():
-        if not line.strip():
-            continue
-
-        stripped = line.strip()
-
-        if stripped in [
-            "User Controls",
-            "Camera Controls",
-            "Video Controls",
-            "Image Controls",
-        ]:
-            continue
-
-        if stripped and stripped[0].isdigit() and ":" in stripped:
-            if current is None:
-                continue
-            parts = stripped.split(":", 1)
-            try:
-                value = int(parts[0].strip())
-                label = parts[1].strip()
-                menus[current].append({"value": value, "label": label})
-            except (ValueError, IndexError):
-                continue
-        elif "0x" in stripped:
-            name = stripped.split()[0]
-            current = name
+    for match in _MENU_LINE.finditer(output):
+        name = match.group(1)
+        if name is not None:
+            current = name.decode()
             menus.setdefault(current, [])
+        elif current is not None:
+            menus[current].append(
+                {"value": int(match.group(2)), "label": match.group(3).decode()}
+            )
 
     return menus
 
 
+_ORDER_MAP = {name: idx for idx, name in enumerate(CONTROL_ORDER)}
+_ORDER_DEFAULT = len(CONTROL_ORDER)
+
+
 def sort_controls(controls: List[Dict]) -> List[Dict]:
-    order_map = {name: idx for idx, name in enumerate(CONTROL_ORDER)}
-    indexed = list(enumerate(controls))
+    # sorted() is stable, so unlisted controls keep their original order.
+    return sorted(controls, key=lambda ctrl: _ORDER_MAP.get(ctrl["name"], _ORDER_DEFAULT))
 
-    def sort_key(item: Tuple[int, Dict]) -> Tuple[int, int]:
-        original_idx, ctrl = item
-        idx = order_map.get(ctrl["name"], len(CONTROL_ORDER))
-        return (idx, original_idx)
 
-    return [ctrl for _, ctrl in sorted(indexed, key=sort_key)]
+def _use_ioctl() -> bool:
+    return V4L2_BACKEND != "v4l2-ctl"
 
 
 def fetch_controls(device: str, include_menus: bool = True) -> List[Dict]:
-    code1, out1, err1 = run_v4l2(["v4l2-ctl", "-d", device, "--list-ctrls"])
+    # Entries are stored already sorted (the uncached path sorts before
+    # returning), so warm hits skip the per-request sort as well.
+    key = (device, include_menus)
+    entry = _CTRL_CACHE.get(key)
+    if entry is not None and time.monotonic() - entry[0] < CTRL_CACHE_TTL:
+        return entry[1]
+    controls = _fetch_controls_uncached(device, include_menus)
+    with _ctrl_cache_lock:
+        _CTRL_CACHE[key] = (time.monotonic(), controls, None)
+    return controls
+
+
+def fetch_controls_payload(device: str) -> bytes:
+    """Serialized {"controls": [...]} body for device.
+
+    Rendered once per cache entry and reused until the entry expires or a
+    write invalidates it, so warm api_ctrls hits skip serialization too.
+    """
+    controls = fetch_controls(device)
+    key = (device, True)
+    entry = _CTRL_CACHE.get(key)
+    if entry is not None and entry[1] is controls and entry[2] is not None:
+        return entry[2]
+    payload = json_dumps_bytes({"controls": controls})
+    with _ctrl_cache_lock:
+        entry = _CTRL_CACHE.get(key)
+        if entry is not None and entry[1] is controls:
+            _CTRL_CACHE[key] = (entry[0], controls, payload)
+    return payload
+
+
+def _fetch_controls_uncached(device: str, include_menus: bool = True) -> List[Dict]:
+    if _use_ioctl():
+        try:
+            controls = v4l2ioctl.query_controls(device, include_menus=include_menus)
+            return sort_controls(controls)
+        except OSError as exc:
+            log(f"ioctl control query failed for {device}, falling back to v4l2-ctl: {exc}")
+    # --list-ctrls-menus output includes the plain control lines as well,
+    # so a single invocation feeds both parsers when menus are wanted.
+    flag = "--list-ctrls-menus" if include_menus else "--list-ctrls"
+    code1, out1, err1 = run_v4l2(["v4l2-ctl", "-d", device, flag])
     if code1 != 0:
-        raise RuntimeError(err1 or out1 or "Failed to list controls")
+        message = decode_output(err1 or out1).strip()
+        raise RuntimeError(message or "Failed to list controls")
     controls = parse_ctrls(out1)
 
     if include_menus:
-        code2, out2, err2 = run_v4l2(["v4l2-ctl", "-d", device, "--list-ctrls-menus"])
-        if code2 == 0:
-            menus = parse_ctrl_menus(out2)
-            log(f"Found {len(menus)} controls with menus")
-            for ctrl in controls:
-                ctrl_name = ctrl["name"]
-                if ctrl_name in menus and menus[ctrl_name]:
-                    ctrl["menu"] = menus[ctrl_name]
-                    ctrl["type"] = "menu"
-                    log(f"  {ctrl_name}: {len(menus[ctrl_name])} menu items")
-        else:
-            log(f"Failed to get menus: code={code2}, err={err2}")
+        menus = parse_ctrl_menus(out1)
+        log(f"Found {len(menus)} controls with menus")
+        for ctrl in controls:
+            ctrl_name = ctrl["name"]
+            if ctrl_name in menus and menus[ctrl_name]:
+                ctrl["menu"] = menus[ctrl_name]
+                ctrl["type"] = "menu"
+                log(f"  {ctrl_name}: {len(menus[ctrl_name])} menu items")
 
     return sort_controls(controls)
 
 
-def validate_values(values: Dict[str, int], controls: List[Dict]) -> Dict[str, int]:
-    allowlist = {ctrl["name"] for ctrl in controls}
-    control_map = {ctrl["name"]: ctrl for ctrl in controls}
+def fetch_controls_many(
+    devices: List[str], include_menus: bool = True
+) -> Dict[str, List[Dict]]:
+    """Fetch controls for several devices concurrently.
+
+    The per-device work is I/O-bound (ioctl or subprocess wait), so threads
+    overlap cleanly. Devices that fail to answer are logged and skipped.
+    """
+    results: Dict[str, List[Dict]] = {}
+    if not devices:
+        return results
+    with ThreadPoolExecutor(max_workers=min(8, len(devices))) as executor:
+        futures = {
+            device: executor.submit(fetch_controls, device, include_menus)
+            for device in devices
+        }
+        for device, future in futures.items():
+            try:
+                results[device] = future.result()
+            except Exception as exc:
+                log(f"Failed to fetch controls for {device}: {exc}")
+    return results
+
+
+# device -> (controls list the bounds were derived from, bounds mapping).
+# The list is compared by identity, so the map follows the control cache's
+# TTL and invalidation without its own bookkeeping.
+_bounds_cache: Dict[str, Tuple[List[Dict], Dict[str, Tuple]]] = {}
+
+
+def fetch_control_bounds(device: str) -> Dict[str, Tuple]:
+    """Slim name -> (min, max, readonly) mapping for validation.
+
+    Derived from the cached control list, so validation callers share one
+    small dict instead of walking full control dicts per request. Reads the
+    menus-inclusive entry: bounds do not depend on menu items, and this way
+    writers share the entry that api_ctrls and the startup warm-up already
+    populate instead of paying a miss on a menu-less variant.
+    """
+    controls = fetch_controls(device)
+    cached = _bounds_cache.get(device)
+    if cached is not None and cached[0] is controls:
+        return cached[1]
+    bounds = {
+        ctrl["name"]: (ctrl.get("min"), ctrl.get("max"), bool(ctrl.get("readonly")))
+        for ctrl in controls
+    }
+    _bounds_cache[device] = (controls, bounds)
+    return bounds
+
+
+def validate_values(values: Dict[str, int], bounds: Dict[str, Tuple]) -> Dict[str, int]:
     validated: Dict[str, int] = {}
 
     for key, value in values.items():
-        if key not in allowlist:
+        bound = bounds.get(key)
+        if bound is None:
             raise ValueError(f"Unknown control: {key}")
-        ctrl_def = control_map.get(key)
-        if ctrl_def and ctrl_def.get("readonly"):
+        min_val, max_val, read_only = bound
+        if read_only:
             log(f"Skipping read-only control: {key}")
             continue
         if isinstance(value, bool):
             value = int(value)
         if not isinstance(value, int):
             raise ValueError(f"Value for {key} must be integer")
-        if ctrl_def:
-            min_val = ctrl_def.get("min")
-            max_val = ctrl_def.get("max")
-            if min_val is not None and max_val is not None:
-                if not (min_val <= value <= max_val):
-                    raise ValueError(f"{key}={value} out of range [{min_val}, {max_val}]")
+        if (
+            min_val is not None
+            and max_val is not None
+            and not (min_val <= value <= max_val)
+        ):
+            raise ValueError(f"{key}={value} out of range [{min_val}, {max_val}]")
         validated[key] = value
 
     return validated
@@ -256,10 +391,28 @@ def validate_values(values: Dict[str, int], controls: List[Dict]) -> Dict[str, i
 def apply_controls(device: str, values: Dict[str, int]) -> Tuple[bool, str, str, int]:
     if not values:
         return True, "", "", 0
+    if _use_ioctl():
+        try:
+            v4l2ioctl.set_controls(device, values)
+            _invalidate_after_apply(device, values)
+            return True, "", "", 0
+        except KeyError as exc:
+            return False, "", str(exc), 1
+        except OSError as exc:
+            return False, "", exc.strerror or str(exc), exc.errno or 1
     set_parts = [f"{key}={value}" for key, value in values.items()]
     cmd = ["v4l2-ctl", "-d", device, f"--set-ctrl={','.join(set_parts)}"]
     code, out, err = run_v4l2(cmd)
-    return code == 0, out, err, code
+    if code == 0:
+        _invalidate_after_apply(device, values)
+    return code == 0, decode_output(out), decode_output(err), code
+
+
+def _invalidate_after_apply(device: str, values: Dict[str, int]) -> None:
+    # Auto-mode toggles change the ranges and active flags of dependent
+    # controls, so cached query results are stale after such a write.
+    if any(key in AUTO_FIRST_CONTROLS for key in values):
+        invalidate_controls(device)
 
 
 def split_controls_by_precedence(
@@ -276,14 +429,22 @@ def order_controls_by_precedence(values: Dict[str, int]) -> List[Tuple[str, int]
     return items
 
 
-def infer_default_prefix(device: str, idx: int, use_default_mapping: bool = True) -> str:
+_VIDEO_RE = re.compile(r"video(\d+)$")
+
+
+def infer_default_prefix(
+    device: str,
+    idx: int,
+    use_default_mapping: bool = True,
+    basename: Optional[str] = None,
+) -> str:
     if not use_default_mapping:
         if idx == 1:
             return "/webcam/"
         return f"/webcam{idx}/"
 
-    base = os.path.basename(device)
-    match = re.match(r"video(\d+)$", base)
+    base = basename if basename is not None else os.path.basename(device)
+    match = _VIDEO_RE.match(base)
     if match:
         number = int(match.group(1))
         if number >= 11:
@@ -303,21 +464,26 @@ def build_cams(
     use_default_mapping: bool = True,
 ) -> List[Camera]:
     cams = []
-    seen = set()
+    # Templates are fixed for the lifetime of the process; parse each one once.
+    compiled_templates = {
+        mode: compile_stream_template(stream_templates.get(mode, ""))
+        for mode in ("webrtc", "mjpg", "snapshot")
+    }
+    # Maps each cam id to the next dedup suffix, so collisions resolve in O(1).
+    seen: Dict[str, int] = {}
     for idx, device in enumerate(devices, start=1):
         base = os.path.basename(device)
         cam_id = base or f"cam{idx}"
         if cam_id in seen:
-            suffix = 2
-            while f"{cam_id}-{suffix}" in seen:
-                suffix += 1
+            suffix = seen[cam_id]
+            seen[cam_id] = suffix + 1
             cam_id = f"{cam_id}-{suffix}"
-        seen.add(cam_id)
+        seen[cam_id] = 2
         prefix = (
             prefixes.get(device)
             or prefixes.get(base)
             or prefixes.get(cam_id)
-            or infer_default_prefix(device, idx, use_default_mapping)
+            or infer_default_prefix(device, idx, use_default_mapping, basename=base)
         )
         prefix = normalize_prefix(prefix)
         template_data = {
@@ -327,17 +493,20 @@ def build_cams(
             "basename": base,
             "index": str(idx),
         }
-        streams = {}
-        for mode, template in stream_templates.items():
-            data = dict(template_data)
-            data["mode"] = mode
-            streams[mode] = format_stream_path(template, data)
+        # template_data is per-camera, so updating the mode key in place is
+        # safe and avoids a dict copy per mode.
+        paths = {}
+        for mode, render in compiled_templates.items():
+            template_data["mode"] = mode
+            paths[mode] = render(template_data)
         cams.append(
             Camera(
                 cam=cam_id,
                 device=device,
                 prefix=prefix,
-                streams=streams,
+                stream_webrtc=paths["webrtc"],
+                stream_mjpg=paths["mjpg"],
+                stream_snapshot=paths["snapshot"],
                 index=idx,
                 basename=base,
             )
@@ -2,123 +2,166 @@
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple
 
 from flask import Blueprint, current_app, jsonify, render_template, request
 
 from .camera import (
     apply_controls,
+    decode_output,
+    fetch_control_bounds,
     fetch_controls,
+    fetch_controls_payload,
+    invalidate_controls,
     order_controls_by_precedence,
     run_v4l2,
+    split_controls_by_precedence,
     validate_values,
 )
 from .state import load_state, save_state
-from .utils import build_storage_prefix, log
+from .utils import build_storage_prefix, json_dumps_bytes, log
+
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
 
 bp = Blueprint("v4l2_ctrls", __name__)
 
+# Shared pool for overlapping independent v4l2-ctl invocations; the
+# subprocess wait releases the GIL, so both calls truly run in parallel.
+_v4l2_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="v4l2-ctl")
+
+
+if orjson is not None:
+
+    class OrjsonProvider(JSONProvider):
+        """JSON provider that routes every jsonify call through orjson."""
+
+        def dumps(self, obj, **kwargs) -> str:
+            return orjson.dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+
+def _json_response(data, status: int = 200):
+    """Serialize data straight into a Response, bypassing jsonify's
+    object walk and content negotiation on the hot endpoints."""
+    return current_app.response_class(
+        json_dumps_bytes(data), status=status, mimetype="application/json"
+    )
+
+
+def _apply_in_batches(
+    device: str, values: Dict[str, int]
+) -> Tuple[Dict[str, int], List[Dict[str, str]]]:
+    """Apply values in two batches, auto-mode controls first.
+
+    A batch is one apply_controls call (a single ioctl or v4l2-ctl
+    invocation). If a batch is rejected, it is retried control by control
+    so the response can name exactly which controls failed.
+    """
+    succeeded: Dict[str, int] = {}
+    failed: List[Dict[str, str]] = []
+    for batch in split_controls_by_precedence(values):
+        if not batch:
+            continue
+        ok, _out, _err, _code = apply_controls(device, batch)
+        if ok:
+            succeeded.update(batch)
+            continue
+        for name, value in order_controls_by_precedence(batch):
+            ok, out, err, code = apply_controls(device, {name: value})
+            if ok:
+                succeeded[name] = value
+            else:
+                error = err or out or f"code {code}"
+                failed.append({"name": name, "error": error})
+                log(f"Failed to apply {name}: {error}")
+    return succeeded, failed
+
 
-def get_cam_or_400(cam_index: str, cams: List) -> Tuple[object, object, int | None]:
+def get_cam_or_400(cam_index: str) -> Tuple[object, object, int | None]:
     if not cam_index:
-        return None, jsonify({"error": "Missing camera id"}), 400
-    cam = next((item for item in cams if item.cam == cam_index), None)
+        return None, _json_response({"error": "Missing camera id"}), 400
+    cam = current_app.config["_cams_by_id"].get(cam_index)
     if cam is None:
-        return None, jsonify({"error": "Camera not found"}), 400
+        return None, _json_response({"error": "Camera not found"}), 400
     return cam, None, None
 
 
 @bp.route("/")
 def index():
-    title = current_app.config.get("title") or "V4L2 Controls"
-    camera_url = current_app.config.get("camera_url")
-    app_base_url = current_app.config.get("app_base_url") or "./"
-    port = current_app.config.get("port", 5000)
-    socket_mode = current_app.config.get("socket_mode", False)
-    storage_prefix = build_storage_prefix(app_base_url, port, socket_mode)
-    persistence_enabled = bool(current_app.config.get("state_dir"))
-    return render_template(
-        "index.html",
-        title=title,
-        camera_url=camera_url,
-        app_base_url=app_base_url,
-        storage_prefix=storage_prefix,
-        persistence_enabled=persistence_enabled,
-    )
+    return render_template("index.html", **current_app.config["_index_context"])
+
+
+def _cams_payload(cams: List) -> List[Dict]:
+    return [
+        {
+            "cam": cam.cam,
+            "device": cam.device,
+            "prefix": cam.prefix,
+            "streams": cam.streams,
+            "index": cam.index,
+            "basename": cam.basename,
+        }
+        for cam in cams
+    ]
 
 
 @bp.route("/api/cams")
 def api_cams():
-    cams = current_app.config["cams"]
-    return jsonify(
-        [
-            {
-                "cam": cam.cam,
-                "device": cam.device,
-                "prefix": cam.prefix,
-                "streams": cam.streams,
-                "index": cam.index,
-                "basename": cam.basename,
-            }
-            for cam in cams
-        ]
+    return current_app.response_class(
+        current_app.config["_cams_json_bytes"], mimetype="application/json"
     )
 
 
 @bp.route("/api/v4l2/ctrls")
 def api_ctrls():
-    cams = current_app.config["cams"]
     cam_index = request.args.get("cam")
-    cam, error, code = get_cam_or_400(cam_index, cams)
+    cam, error, code = get_cam_or_400(cam_index)
     if error:
         return error, code
 
     try:
-        controls = fetch_controls(cam.device)
+        payload = fetch_controls_payload(cam.device)
     except RuntimeError as exc:
-        return jsonify({"error": str(exc)}), 500
-    return jsonify({"controls": controls})
+        return _json_response({"error": str(exc)}, 500)
+    return current_app.response_class(payload, mimetype="application/json")
 
 
 @bp.route("/api/v4l2/set", methods=["POST"])
 def api_set():
-    cams = current_app.config["cams"]
     cam_index = request.args.get("cam")
-    cam, error, code = get_cam_or_400(cam_index, cams)
+    cam, error, code = get_cam_or_400(cam_index)
     if error:
         return error, code
     data = request.get_json(silent=True) or {}
     if not isinstance(data, dict):
-        return jsonify({"error": "Invalid JSON body"}), 400
+        return _json_response({"error": "Invalid JSON body"}, 400)
     if not data:
-        return jsonify({"error": "No controls provided"}), 400
+        return _json_response({"error": "No controls provided"}, 400)
     try:
-        controls = fetch_controls(cam.device, include_menus=False)
-        validated = validate_values(data, controls)
+        bounds = fetch_control_bounds(cam.device)
+        validated = validate_values(data, bounds)
     except RuntimeError as exc:
-        return jsonify({"ok": False, "error": str(exc)}), 500
+        return _json_response({"ok": False, "error": str(exc)}, 500)
     except ValueError as exc:
-        return jsonify({"error": str(exc)}), 400
+        return _json_response({"error": str(exc)}, 400)
 
-    succeeded: Dict[str, int] = {}
-    failed: List[Dict[str, str]] = []
-    for name, value in order_controls_by_precedence(validated):
-        ok, out, err, code = apply_controls(cam.device, {name: value})
-        if ok:
-            succeeded[name] = value
-        else:
-            error = err or out or f"code {code}"
-            failed.append({"name": name, "error": error})
-            log(f"Failed to apply {name}: {error}")
+    succeeded, failed = _apply_in_batches(cam.device, validated)
+    if succeeded:
+        invalidate_controls(cam.device)
     if failed:
-        return (
-            jsonify(
-                {
-                    "ok": False,
-                    "applied": succeeded,
-                    "failed": failed,
-                }
-            ),
+        return _json_response(
+            {
+                "ok": False,
+                "applied": succeeded,
+                "failed": failed,
+            },
             500,
         )
     state_dir = current_app.config.get("state_dir")
@@ -127,14 +170,13 @@ def api_set():
         persisted = load_state(state_path)
         persisted.update(succeeded)
         save_state(state_path, persisted)
-    return jsonify({"ok": True, "applied": succeeded, "failed": []})
+    return _json_response({"ok": True, "applied": succeeded, "failed": []})
 
 
 @bp.route("/api/v4l2/reset", methods=["POST"])
 def api_reset():
-    cams = current_app.config["cams"]
     cam_index = request.args.get("cam")
-    cam, error, code = get_cam_or_400(cam_index, cams)
+    cam, error, code = get_cam_or_400(cam_index)
     if error:
         return error, code
     try:
@@ -153,52 +195,53 @@ def api_reset():
     if not defaults:
         log("No default values found for controls")
     else:
-        for name, value in order_controls_by_precedence(defaults):
-            ok, out, err, code = apply_controls(cam.device, {name: value})
-            if ok:
-                succeeded.append(name)
-            else:
-                error = err or out or f"code {code}"
-                failed.append({"name": name, "error": error})
-                log(f"Failed to reset {name}: {error}")
+        applied, failed = _apply_in_batches(cam.device, defaults)
+        succeeded = list(applied)
         log(f"Reset {len(succeeded)} controls to defaults, {len(failed)} failed")
+        if succeeded:
+            invalidate_controls(cam.device)
     state_removed = False
     state_dir = current_app.config.get("state_dir")
     if state_dir:
         state_path = state_dir / f"{cam.cam}.json"
-        if state_path.exists():
+        try:
             state_path.unlink()
             log(f"Removed state file: {state_path}")
-        state_removed = not state_path.exists()
+        except FileNotFoundError:
+            pass
+        # Either branch leaves no state file, matching the old
+        # exists/unlink/exists dance in a single syscall.
+        state_removed = True
     return jsonify({"succeeded": succeeded, "failed": failed, "state_removed": state_removed})
 
 
 @bp.route("/api/v4l2/info")
 def api_info():
-    cams = current_app.config["cams"]
     cam_index = request.args.get("cam")
-    cam, error, code = get_cam_or_400(cam_index, cams)
+    cam, error, code = get_cam_or_400(cam_index)
     if error:
         return error, code
     code1, out1, err1 = run_v4l2(["v4l2-ctl", "-d", cam.device, "-D"])
     if code1 != 0:
-        return jsonify({"error": err1 or out1 or "Failed to fetch device info"}), 500
-    return jsonify({"info": out1})
+        error = decode_output(err1 or out1)
+        return jsonify({"error": error or "Failed to fetch device info"}), 500
+    return jsonify({"info": decode_output(out1)})
 
 
 @bp.route("/api/v4l2/debug")
 def api_debug():
     """Debug endpoint to see raw v4l2-ctl output"""
-    cams = current_app.config["cams"]
     cam_index = request.args.get("cam")
-    cam, error, code = get_cam_or_400(cam_index, cams)
+    cam, error, code = get_cam_or_400(cam_index)
     if error:
         return error, code
 
-    code1, out1, err1 = run_v4l2(["v4l2-ctl", "-d", cam.device, "--list-ctrls"])
-    code2, out2, err2 = run_v4l2(
-        ["v4l2-ctl", "-d", cam.device, "--list-ctrls-menus"]
+    future1 = _v4l2_pool.submit(run_v4l2, ["v4l2-ctl", "-d", cam.device, "--list-ctrls"])
+    future2 = _v4l2_pool.submit(
+        run_v4l2, ["v4l2-ctl", "-d", cam.device, "--list-ctrls-menus"]
     )
+    code1, out1, err1 = future1.result()
+    code2, out2, err2 = future2.result()
 
     menus = {}
     if code2 == 0:
@@ -206,15 +249,53 @@ def api_debug():
 
         menus = parse_ctrl_menus(out2)
 
-    return jsonify(
+    return _json_response(
         {
             "device": cam.device,
-            "list_ctrls": {"code": code1, "stdout": out1, "stderr": err1},
-            "list_ctrls_menus": {"code": code2, "stdout": out2, "stderr": err2},
+            "list_ctrls": {
+                "code": code1,
+                "stdout": decode_output(out1),
+                "stderr": decode_output(err1),
+            },
+            "list_ctrls_menus": {
+                "code": code2,
+                "stdout": decode_output(out2),
+                "stderr": decode_output(err2),
+            },
             "parsed_menus": menus,
         }
     )
 
 
 def register_routes(app) -> None:
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    # Keep jsonify compact and insertion-ordered on every provider; the
+    # pretty-printed, key-sorted defaults cost real time on large payloads.
+    if hasattr(app.json, "compact"):
+        app.json.compact = True
+        app.json.sort_keys = False
+    app.config["JSONIFY_PRETTYPRINT_REGULAR"] = False
+    app.config["JSON_SORT_KEYS"] = False
+    # The camera list is fixed at startup, so the /api/cams body can be
+    # serialized once and served as bytes.
+    app.config["_cams_json_bytes"] = json_dumps_bytes(
+        _cams_payload(app.config.get("cams", []))
+    )
+    app.config["_cams_by_id"] = {
+        cam.cam: cam for cam in app.config.get("cams", [])
+    }
+    # Likewise the index template context only depends on startup config.
+    app_base_url = app.config.get("app_base_url") or "./"
+    app.config["_index_context"] = {
+        "title": app.config.get("title") or "V4L2 Controls",
+        "camera_url": app.config.get("camera_url"),
+        "app_base_url": app_base_url,
+        "storage_prefix": build_storage_prefix(
+            app_base_url,
+            app.config.get("port", 5000),
+            app.config.get("socket_mode", False),
+        ),
+        "persistence_enabled": bool(app.config.get("state_dir")),
+    }
     app.register_blueprint(bp)
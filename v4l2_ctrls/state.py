@@ -2,25 +2,33 @@
 
 from __future__ import annotations
 
-import json
 import os
 from pathlib import Path
 from typing import Dict
 
 from .camera import (
     apply_controls,
-    fetch_controls,
+    fetch_control_bounds,
     order_controls_by_precedence,
     validate_values,
 )
-from .utils import log
+from .utils import json_dumps_bytes, json_loads, log
+
+# Directories already created by save_state; skips the stat+mkdir pair on
+# every save after the first for a given state dir.
+_known_dirs: set = set()
 
 
 def load_state(path: Path) -> Dict[str, int]:
-    if not path.exists():
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
+        return {}
+    except OSError as exc:
+        log(f"Failed to load state from {path}: {exc}")
         return {}
     try:
-        data = json.loads(path.read_text())
+        data = json_loads(raw)
         if isinstance(data, dict):
             return {k: int(v) for k, v in data.items() if isinstance(k, str)}
     except Exception as exc:
@@ -29,10 +37,25 @@ def load_state(path: Path) -> Dict[str, int]:
 
 
 def save_state(path: Path, values: Dict[str, int]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp_path = path.with_suffix(path.suffix + ".tmp")
-    tmp_path.write_text(json.dumps(values, indent=2, sort_keys=True))
-    os.replace(tmp_path, path)
+    if path.parent not in _known_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _known_dirs.add(path.parent)
+    tmp_path = path.parent / f"{path.name}.tmp"
+    # Compact bytes: the state files are machine-read, so pretty-printing
+    # and key sorting were pure serialization overhead.
+    payload = json_dumps_bytes(values)
+    try:
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+    except OSError:
+        # The directory may have been removed since it was recorded;
+        # recreate it and retry once rather than failing every save
+        # until restart.
+        _known_dirs.discard(path.parent)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _known_dirs.add(path.parent)
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
 
 
 def restore_state(device: str, path: Path) -> None:
@@ -40,9 +63,9 @@ def restore_state(device: str, path: Path) -> None:
     if not saved:
         log("No persisted controls to restore")
         return
-    controls = fetch_controls(device, include_menus=False)
+    bounds = fetch_control_bounds(device)
     try:
-        validated = validate_values(saved, controls)
+        validated = validate_values(saved, bounds)
     except ValueError as exc:
         log(f"State validation error: {exc}")
         validated = {}
@@ -2,13 +2,46 @@
 
 from __future__ import annotations
 
-import time
+import functools
+import json
+import logging
+import re
+import string
 from typing import Dict, List
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib codec works everywhere
+    orjson = None
+
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+
+else:
+    json_loads = json.loads
+
+    def json_dumps_bytes(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+
+# One handler for the whole package; the logging formatter caches the
+# rendered timestamp within the same second, unlike a strftime per call.
+_logger = logging.getLogger("v4l2_ctrls")
+if not _logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(
+        logging.Formatter("[%(asctime)s] %(message)s", datefmt="%H:%M:%S")
+    )
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
 
 def log(msg: str) -> None:
-    ts = time.strftime("%H:%M:%S")
-    print(f"[{ts}] {msg}", flush=True)
+    _logger.info(msg)
 
 
 def normalize_prefix(prefix: str) -> str:
@@ -21,17 +54,18 @@ def normalize_prefix(prefix: str) -> str:
     return prefix
 
 
+# key=value with surrounding whitespace trimmed; one match replaces the
+# separate contains/split/strip passes per item.
+_PREFIX_RE = re.compile(r"^\s*([^=\s]+)\s*=\s*(.+?)\s*$")
+
+
 def parse_stream_prefixes(items: List[str]) -> Dict[str, str]:
     prefixes: Dict[str, str] = {}
     for item in items:
-        if "=" not in item:
-            raise SystemExit(f"Invalid --stream-prefix value: {item}")
-        key, value = item.split("=", 1)
-        key = key.strip()
-        value = value.strip()
-        if not key or not value:
+        match = _PREFIX_RE.match(item)
+        if not match:
             raise SystemExit(f"Invalid --stream-prefix value: {item}")
-        prefixes[key] = normalize_prefix(value)
+        prefixes[match.group(1)] = normalize_prefix(match.group(2))
     return prefixes
 
 
@@ -42,6 +76,39 @@ def format_stream_path(template: str, data: Dict[str, str]) -> str:
         return template
 
 
+@functools.lru_cache(maxsize=256)
+def compile_stream_template(template: str):
+    """Compile a {field} template into a join-based formatter.
+
+    Parses the template once and returns a callable taking the substitution
+    dict, skipping str.format's per-call parse. A missing field returns the
+    template unchanged, matching format_stream_path. Memoized so identical
+    templates (the same default is often used for several modes) share one
+    compiled formatter.
+    """
+    try:
+        segments = [
+            (literal, field)
+            for literal, field, _spec, _conv in string.Formatter().parse(template)
+        ]
+    except ValueError:
+        return lambda data: template
+
+    def render(data: Dict[str, str]) -> str:
+        parts = []
+        for literal, field in segments:
+            if literal:
+                parts.append(literal)
+            if field is not None:
+                try:
+                    parts.append(str(data[field]))
+                except KeyError:
+                    return template
+        return "".join(parts)
+
+    return render
+
+
 def build_storage_prefix(app_base_url: str, port: int, socket_mode: bool) -> str:
     path_part = (
         app_base_url.strip("/").replace("/", "-")
@@ -0,0 +1,322 @@
+"""Direct VIDIOC ioctl access to V4L2 device controls.
+
+Queries and sets controls by talking to /dev/video* and /dev/v4l-subdev*
+nodes with fcntl.ioctl instead of shelling out to v4l2-ctl. Produces the
+same control dictionaries as the text parsers in camera.py so callers can
+switch between the two backends freely.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import errno
+import fcntl
+import os
+import threading
+from typing import Dict, List, Tuple
+
+
+class v4l2_queryctrl(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("minimum", ctypes.c_int32),
+        ("maximum", ctypes.c_int32),
+        ("step", ctypes.c_int32),
+        ("default_value", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+class v4l2_query_ext_ctrl(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("minimum", ctypes.c_int64),
+        ("maximum", ctypes.c_int64),
+        ("step", ctypes.c_uint64),
+        ("default_value", ctypes.c_int64),
+        ("flags", ctypes.c_uint32),
+        ("elem_size", ctypes.c_uint32),
+        ("elems", ctypes.c_uint32),
+        ("nr_of_dims", ctypes.c_uint32),
+        ("dims", ctypes.c_uint32 * 4),
+        ("reserved", ctypes.c_uint32 * 32),
+    ]
+
+
+class _querymenu_union(ctypes.Union):
+    _fields_ = [
+        ("name", ctypes.c_char * 32),
+        ("value", ctypes.c_int64),
+    ]
+
+
+class v4l2_querymenu(ctypes.Structure):
+    _pack_ = 1
+    _anonymous_ = ("_u",)
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("index", ctypes.c_uint32),
+        ("_u", _querymenu_union),
+        ("reserved", ctypes.c_uint32),
+    ]
+
+
+class _ext_control_union(ctypes.Union):
+    _fields_ = [
+        ("value", ctypes.c_int32),
+        ("value64", ctypes.c_int64),
+        ("ptr", ctypes.c_void_p),
+    ]
+
+
+class v4l2_ext_control(ctypes.Structure):
+    _pack_ = 1
+    _anonymous_ = ("_u",)
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32 * 1),
+        ("_u", _ext_control_union),
+    ]
+
+
+class v4l2_ext_controls(ctypes.Structure):
+    _fields_ = [
+        ("which", ctypes.c_uint32),
+        ("count", ctypes.c_uint32),
+        ("error_idx", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+        ("reserved", ctypes.c_uint32 * 1),
+        ("controls", ctypes.POINTER(v4l2_ext_control)),
+    ]
+
+
+_IOC_WRITE = 1
+_IOC_READ = 2
+
+
+def _IOWR(type_char: str, nr: int, struct: type) -> int:
+    return (
+        ((_IOC_READ | _IOC_WRITE) << 30)
+        | (ctypes.sizeof(struct) << 16)
+        | (ord(type_char) << 8)
+        | nr
+    )
+
+
+VIDIOC_QUERYCTRL = _IOWR("V", 36, v4l2_queryctrl)
+VIDIOC_QUERYMENU = _IOWR("V", 37, v4l2_querymenu)
+VIDIOC_QUERY_EXT_CTRL = _IOWR("V", 103, v4l2_query_ext_ctrl)
+VIDIOC_G_EXT_CTRLS = _IOWR("V", 71, v4l2_ext_controls)
+VIDIOC_S_EXT_CTRLS = _IOWR("V", 72, v4l2_ext_controls)
+
+V4L2_CTRL_FLAG_DISABLED = 0x0001
+V4L2_CTRL_FLAG_READ_ONLY = 0x0004
+V4L2_CTRL_FLAG_INACTIVE = 0x0010
+V4L2_CTRL_FLAG_WRITE_ONLY = 0x0040
+V4L2_CTRL_FLAG_HAS_PAYLOAD = 0x0100
+V4L2_CTRL_FLAG_NEXT_CTRL = 0x80000000
+V4L2_CTRL_FLAG_NEXT_COMPOUND = 0x40000000
+
+V4L2_CTRL_TYPE_INTEGER = 1
+V4L2_CTRL_TYPE_BOOLEAN = 2
+V4L2_CTRL_TYPE_MENU = 3
+V4L2_CTRL_TYPE_BUTTON = 4
+V4L2_CTRL_TYPE_INTEGER64 = 5
+V4L2_CTRL_TYPE_CTRL_CLASS = 6
+V4L2_CTRL_TYPE_STRING = 7
+V4L2_CTRL_TYPE_BITMASK = 8
+V4L2_CTRL_TYPE_INTEGER_MENU = 9
+
+_TYPE_NAMES = {
+    V4L2_CTRL_TYPE_INTEGER: "int",
+    V4L2_CTRL_TYPE_BOOLEAN: "bool",
+    V4L2_CTRL_TYPE_MENU: "menu",
+    V4L2_CTRL_TYPE_BUTTON: "button",
+    V4L2_CTRL_TYPE_INTEGER64: "int64",
+    V4L2_CTRL_TYPE_BITMASK: "bitmask",
+    V4L2_CTRL_TYPE_INTEGER_MENU: "menu",
+}
+
+_fd_lock = threading.Lock()
+_fds: Dict[str, int] = {}
+# device -> control name -> (id, type), filled in by query_controls
+_name_info: Dict[str, Dict[str, Tuple[int, int]]] = {}
+
+
+def get_fd(device: str) -> int:
+    """Return a cached read/write fd for device, opening it on first use."""
+    with _fd_lock:
+        fd = _fds.get(device)
+        if fd is None:
+            fd = os.open(device, os.O_RDWR | os.O_NONBLOCK)
+            _fds[device] = fd
+        return fd
+
+
+def control_var_name(raw: bytes) -> str:
+    # Mirror v4l2-ctl's name2var(): lowercase alphanumerics, any run of
+    # other characters collapses to a single underscore.
+    out: List[str] = []
+    pending = False
+    for ch in raw.decode("ascii", "replace"):
+        if ch.isalnum():
+            if pending:
+                out.append("_")
+            out.append(ch.lower())
+            pending = False
+        elif out:
+            pending = True
+    return "".join(out)
+
+
+def _get_value(fd: int, ctrl_id: int, ctrl_type: int) -> int:
+    ctrl = v4l2_ext_control()
+    ctrl.id = ctrl_id
+    ctrls = v4l2_ext_controls()
+    ctrls.which = 0  # V4L2_CTRL_WHICH_CUR_VAL
+    ctrls.count = 1
+    ctrls.controls = ctypes.pointer(ctrl)
+    fcntl.ioctl(fd, VIDIOC_G_EXT_CTRLS, ctrls)
+    if ctrl_type == V4L2_CTRL_TYPE_INTEGER64:
+        return ctrl.value64
+    return ctrl.value
+
+
+def _query_menu_items(
+    fd: int, ctrl_id: int, ctrl_type: int, minimum: int, maximum: int
+) -> List[Dict]:
+    items: List[Dict] = []
+    menu = v4l2_querymenu()
+    for index in range(minimum, maximum + 1):
+        menu.id = ctrl_id
+        menu.index = index
+        try:
+            fcntl.ioctl(fd, VIDIOC_QUERYMENU, menu)
+        except OSError:
+            # Gaps in the menu index range are normal.
+            continue
+        if ctrl_type == V4L2_CTRL_TYPE_INTEGER_MENU:
+            label = str(menu.value)
+        else:
+            label = menu.name.decode("ascii", "replace")
+        items.append({"value": index, "label": label})
+    return items
+
+
+# VIDIOC_QUERY_EXT_CTRL needs kernel 3.17+; flipped off on first ENOTTY so
+# older kernels fall back to the 32-bit VIDIOC_QUERYCTRL walk once.
+_have_query_ext = True
+
+
+def query_controls(device: str, include_menus: bool = True) -> List[Dict]:
+    """Enumerate all controls on device via VIDIOC_QUERY_EXT_CTRL.
+
+    Walks the control list with V4L2_CTRL_FLAG_NEXT_CTRL and returns control
+    dicts shaped like camera.parse_ctrls output. Falls back to the legacy
+    VIDIOC_QUERYCTRL (32-bit bounds) on kernels without the extended query.
+    """
+    global _have_query_ext
+    fd = get_fd(device)
+    if _have_query_ext:
+        try:
+            return _enumerate_controls(
+                fd, device, v4l2_query_ext_ctrl(), VIDIOC_QUERY_EXT_CTRL, include_menus
+            )
+        except OSError as exc:
+            if exc.errno != errno.ENOTTY:
+                raise
+            _have_query_ext = False
+    return _enumerate_controls(
+        fd, device, v4l2_queryctrl(), VIDIOC_QUERYCTRL, include_menus
+    )
+
+
+def _enumerate_controls(
+    fd: int, device: str, query, request: int, include_menus: bool
+) -> List[Dict]:
+    controls: List[Dict] = []
+    names: Dict[str, Tuple[int, int]] = {}
+    query.id = V4L2_CTRL_FLAG_NEXT_CTRL | V4L2_CTRL_FLAG_NEXT_COMPOUND
+    while True:
+        try:
+            fcntl.ioctl(fd, request, query)
+        except OSError as exc:
+            if exc.errno == errno.EINVAL:
+                break
+            raise
+        ctrl_id = query.id
+        ctrl_type = query.type
+        flags = query.flags
+        skip = (
+            ctrl_type == V4L2_CTRL_TYPE_CTRL_CLASS
+            or flags & V4L2_CTRL_FLAG_DISABLED
+            or flags & V4L2_CTRL_FLAG_HAS_PAYLOAD
+        )
+        if not skip:
+            name = control_var_name(query.name)
+            ctrl = {
+                "name": name,
+                "type": _TYPE_NAMES.get(ctrl_type, "unknown"),
+                "min": query.minimum,
+                "max": query.maximum,
+                "step": query.step,
+                "default": query.default_value,
+                "value": None,
+                "readonly": bool(flags & V4L2_CTRL_FLAG_READ_ONLY),
+                "inactive": bool(flags & V4L2_CTRL_FLAG_INACTIVE),
+                "menu": [],
+            }
+            if ctrl_type != V4L2_CTRL_TYPE_BUTTON and not flags & V4L2_CTRL_FLAG_WRITE_ONLY:
+                try:
+                    ctrl["value"] = _get_value(fd, ctrl_id, ctrl_type)
+                except OSError:
+                    pass
+            if include_menus and ctrl_type in (
+                V4L2_CTRL_TYPE_MENU,
+                V4L2_CTRL_TYPE_INTEGER_MENU,
+            ):
+                ctrl["menu"] = _query_menu_items(
+                    fd, ctrl_id, ctrl_type, query.minimum, query.maximum
+                )
+            controls.append(ctrl)
+            names[name] = (ctrl_id, ctrl_type)
+        query.id = ctrl_id | V4L2_CTRL_FLAG_NEXT_CTRL | V4L2_CTRL_FLAG_NEXT_COMPOUND
+    _name_info[device] = names
+    return controls
+
+
+def set_controls(device: str, values: Dict[str, int]) -> None:
+    """Apply all values in a single VIDIOC_S_EXT_CTRLS ioctl.
+
+    Raises KeyError for control names the device does not expose and OSError
+    when the ioctl itself fails.
+    """
+    if not values:
+        return
+    fd = get_fd(device)
+    names = _name_info.get(device)
+    if names is None:
+        query_controls(device, include_menus=False)
+        names = _name_info.get(device, {})
+    unknown = [key for key in values if key not in names]
+    if unknown:
+        raise KeyError(f"Unknown control(s): {', '.join(unknown)}")
+    array = (v4l2_ext_control * len(values))()
+    for slot, (name, value) in zip(array, values.items()):
+        ctrl_id, ctrl_type = names[name]
+        slot.id = ctrl_id
+        if ctrl_type == V4L2_CTRL_TYPE_INTEGER64:
+            slot.value64 = int(value)
+        else:
+            slot.value = int(value)
+    ctrls = v4l2_ext_controls()
+    ctrls.which = 0  # V4L2_CTRL_WHICH_CUR_VAL
+    ctrls.count = len(values)
+    ctrls.controls = ctypes.cast(array, ctypes.POINTER(v4l2_ext_control))
+    fcntl.ioctl(fd, VIDIOC_S_EXT_CTRLS, ctrls)